@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
-import glob
 import os
 import altair as alt
 import logging
 from datetime import datetime
 import glob as pyglob
+from datasets import DATASETS
+from history_store import get_store
+from query_engine import cache_info, cached_search, is_valid_query, successor_histograms
+from omission_stats import get_stats
+from perf_utils import QueryTimer, peak_rss_bytes, session_state_bytes, start_profile, stop_profile
+from result_render import PAGE_SIZE, page_count, results_page_html, successor_rows, summarize
 
 # 日志设置
 log_dir = 'log'
@@ -19,134 +24,159 @@ if not logger.handlers:
     formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
     fh.setFormatter(formatter)
     logger.addHandler(fh)
-# 自动清理3天前的日志
-log_files = sorted(pyglob.glob(os.path.join(log_dir, 'sort3_*.log')))
-if len(log_files) > 3:
-    for old_file in log_files[:-3]:
-        try:
-            os.remove(old_file)
-        except Exception as e:
-            logger.warning(f'Failed to remove old log: {old_file}, {e}')
+# 自动清理3天前的日志，cProfile 文件同样只保留最近3个
+for pattern in ['sort3_*.log', 'profile_*.prof']:
+    log_files = sorted(pyglob.glob(os.path.join(log_dir, pattern)))
+    if len(log_files) > 3:
+        for old_file in log_files[:-3]:
+            try:
+                os.remove(old_file)
+            except Exception as e:
+                logger.warning(f'Failed to remove old log: {old_file}, {e}')
 
 # 显示数据更新提示
 st.markdown("<div style='font-size:20px;font-weight:bold;color:#e67e22;'>每晚23:00自动更新数据</div>", unsafe_allow_html=True)
 
-st.title("排列三历史号码连续查询")
+# 彩种：各自独立的数据文件、内存数据和索引，同一进程内并存
+dataset = st.selectbox("彩种", list(DATASETS.values()), format_func=lambda d: d.name, index=0)
+INDICATORS = dataset.indicators
+
+st.title(f"{dataset.name}历史号码连续查询")
 
 # 输入
-indicator = st.selectbox("选择数据指标", ["全部", "和尾", "跨度", "百位", "十位", "个位"], index=0)
-seq = st.text_input("输入连续号码（如2687）")
+indicator = st.selectbox("选择数据指标", ["全部"] + INDICATORS, index=0)
+seq = st.text_input("输入连续号码（如2687），支持通配 2?8*、[13] 及组合条件 百位=2&跨度=7,百位=6").strip()
 search_mode = st.selectbox("查找模式", ["顺序查找", "逆序查找", "双向查找"], index=2)
 
-# 指标映射
-col_map = {"百位": "hundred", "十位": "ten", "个位": "unit", "和尾": "tail", "跨度": "gap"}
+if st.button("查询"):
+    if seq and indicator and is_valid_query(seq, dataset=dataset):
+        # 查询参数保存在会话中，翻页等重跑时保留结果
+        st.session_state["query"] = (dataset.key, indicator, seq, search_mode)
+    else:
+        st.session_state.pop("query", None)
+
+# 性能面板与单次查询的 cProfile 分析开关
+show_perf = st.sidebar.checkbox("显示性能面板", value=False)
+if st.sidebar.button("对下一次查询做 cProfile 分析"):
+    st.session_state["profile_next"] = True
 
-if st.button("查询") and seq and seq.isdigit() and len(seq) >= 2 and indicator:
-    files = glob.glob("data/sort3_*.csv")
-    seq_list = list(seq)
-    n = len(seq_list)
+query = st.session_state.get("query")
+# 切换彩种后不再展示上一彩种的查询结果
+if query and query[0] != dataset.key:
+    query = None
+if query:
+    _, q_indicator, q_seq, q_mode = query
+    timer = QueryTimer()
+    profiler = start_profile() if st.session_state.pop("profile_next", False) else None
+    with timer.stage("load"):
+        store = get_store(dataset=dataset)
     
     # 需要搜索的指标
-    if indicator == "全部":
-        indicators_to_search = ["和尾", "跨度", "百位", "十位", "个位"]
+    if q_indicator == "全部":
+        indicators_to_search = INDICATORS
     else:
-        indicators_to_search = [indicator]
-    all_results = {}
-    all_dfs = {}
-    for ind in indicators_to_search:
-        results = []
-        dfs = []
-        for file in files:
-            year = os.path.basename(file).split("_")[1].split(".")[0]
-            df = pd.read_csv(file, dtype=str)
-            df["year"] = year
-            df["row_idx"] = range(len(df))
-            dfs.append(df)
-            col = col_map[ind]
-            # 取出要比对的列，全部转为字符串
-            nums = df[col].astype(str).tolist()
-            # 顺序查找
-            if search_mode in ["顺序查找", "双向查找"]:
-                for i in range(len(nums) - n + 1):
-                    if nums[i:i+n] == seq_list:
-                        issues = [df.iloc[i+j]["issue"] for j in range(n)]
-                        idxs = [i+j for j in range(n)]
-                        results.append((year, issues, "顺序", idxs, file))
-            # 逆序查找
-            if search_mode in ["逆序查找", "双向查找"]:
-                seq_reverse = seq_list[::-1]
-                for i in range(len(nums) - n + 1):
-                    if nums[i:i+n] == seq_reverse:
-                        issues = [df.iloc[i+j]["issue"] for j in range(n)]
-                        idxs = [i+j for j in range(n)]
-                        results.append((year, issues, "逆序", idxs, file))
-        all_results[ind] = results
-        all_dfs[ind] = pd.concat(dfs, ignore_index=True)
+        indicators_to_search = [q_indicator]
+    with timer.stage("match"):
+        all_results = cached_search(store, q_seq, indicators_to_search, q_mode)
+    info = cache_info()
+    
+    # 先展示各指标、各模式的匹配数汇总
+    with timer.stage("summary"):
+        st.markdown(f'<div style="font-size:28px;font-weight:bold;color:#0074D9;margin-top:32px;margin-bottom:12px;">{q_seq} 匹配汇总：</div>', unsafe_allow_html=True)
+        st.table(pd.DataFrame(summarize(all_results)).set_index("指标"))
+        st.caption(f'数据版本 {store.version} · 查询缓存 命中{info["hits"]} / 未命中{info["misses"]}（{info["size"]}/{info["maxsize"]}条）')
     
-    # 展示每个指标的表格输出，标题高亮，子项目缩进，命中数字大红色
-    for ind in [i for i in ["和尾", "跨度", "百位", "十位", "个位"] if i in all_results]:
+    # 明细按指标、按页懒渲染，每页一次输出
+    hit_inds = [i for i in all_results if all_results[i]]
+    html_bytes = 0
+    shown = 0
+    if hit_inds:
+        ind = st.radio("命中指标", hit_inds, horizontal=True)
         results = all_results[ind]
-        df = all_dfs[ind]
-        # 大标题高亮
-        st.markdown(f'<div style="font-size:28px;font-weight:bold;color:#0074D9;margin-top:32px;margin-bottom:12px;">{ind} 匹配区间明细表：</div>', unsafe_allow_html=True)
-        if results:
-            for idx, (year, issues, mode, idxs, file) in enumerate(results, 1):
-                df_file = pd.read_csv(file, dtype=str)
-                df_file["hundred"] = df_file["hundred"].astype(int)
-                df_file["ten"] = df_file["ten"].astype(int)
-                df_file["unit"] = df_file["unit"].astype(int)
-                df_file["sum"] = df_file["hundred"] + df_file["ten"] + df_file["unit"]
-                df_file["tail"] = df_file["sum"] % 10
-                df_file["gap"] = df_file[["hundred", "ten", "unit"]].max(axis=1) - df_file[["hundred", "ten", "unit"]].min(axis=1)
-                col = col_map[ind]
-                start = max(idxs[0] - 3, 0)
-                end = min(idxs[-1] + 3, len(df_file) - 1)
-                show_df = df_file.iloc[start:end+1].copy()
-                show_df.reset_index(drop=True, inplace=True)
-                hit_range = set(idxs)
-                def trend_row(row, i):
-                    balls = []
-                    # 指标不同，走势不同
-                    if ind in ["百位", "十位", "个位"]:
-                        for j in range(10):
-                            if getattr(row, col) == j and (start + i) in hit_range:
-                                balls.append(f'<span style="color:#e60000;font-weight:bold;">{j}</span>')
-                            else:
-                                balls.append(f'<span style="color:#bbb;">{j}</span>')
-                    elif ind == "和尾":
-                        for j in range(10):
-                            if getattr(row, "tail") == j and (start + i) in hit_range:
-                                balls.append(f'<span style="color:#e60000;font-weight:bold;">{j}</span>')
-                            else:
-                                balls.append(f'<span style="color:#bbb;">{j}</span>')
-                    elif ind == "跨度":
-                        for j in range(10):
-                            if getattr(row, "gap") == j and (start + i) in hit_range:
-                                balls.append(f'<span style="color:#e60000;font-weight:bold;">{j}</span>')
-                            else:
-                                balls.append(f'<span style="color:#bbb;">{j}</span>')
-                    return " ".join(balls)
-                show_df["走势"] = [trend_row(row, i) for i, row in enumerate(show_df.itertuples(), start=0)]
-                # 美化匹配信息标题，缩进
-                mode_color = {'顺序': '#2ecc40', '逆序': '#ff8000'}
-                mode_disp = '<span style="color:{};font-weight:bold;">{}</span>'.format(mode_color.get(mode, '#0074D9'), mode)
-                match_info = (
-                    '<div style="margin-left:32px;">'
-                    '<span style="font-size:20px;font-weight:bold;color:#0074D9;">匹配{}:</span> '
-                    '<span style="font-size:16px;color:#555;">年份：</span><span style="font-size:16px;font-weight:bold;color:#222;">{}</span>，'
-                    '<span style="font-size:16px;color:#555;">期号：</span><span style="font-size:16px;font-weight:bold;color:#0074D9;">{}</span>，'
-                    '<span style="font-size:16px;color:#555;">模式：</span>{}'
-                    '</div>'
-                ).format(idx, year, ','.join(issues), mode_disp)
-                st.markdown(match_info, unsafe_allow_html=True)
-                # 输出表格，整体缩进
-                table_html = f"<div style='margin-left:32px;'><table border='1' style='border-collapse:collapse;'>"
-                table_html += f"<tr><th>期号</th><th>奖号</th><th>和值</th><th>{ind}走势</th></tr>"
-                for i, row in show_df.iterrows():
-                    table_html += f"<tr><td>{row['issue']}</td><td>{row['hundred']}{row['ten']}{row['unit']}</td><td>{row['sum']}</td><td style='font-family:monospace;'>{row['走势']}</td></tr>"
-                table_html += "</table></div>"
-                st.markdown(table_html, unsafe_allow_html=True)
+        view = st.radio("结果展示", ["后续分布", "明细"], horizontal=True)
+        if view == "后续分布":
+            # 所有命中之后1-3期各指标的数字分布，替代逐条翻看明细表
+            with timer.stage("successor"):
+                histograms = successor_histograms(store, [r[3][-1] for r in results])
+                successor_df = pd.DataFrame(successor_rows(histograms))
+            st.markdown(f'<div style="font-size:28px;font-weight:bold;color:#0074D9;margin-top:32px;margin-bottom:12px;">{ind} 命中后续分布（共{len(results)}次命中）：</div>', unsafe_allow_html=True)
+            with timer.stage("render"):
+                successor_chart = alt.Chart(successor_df).mark_rect().encode(
+                    x=alt.X("数字:O"),
+                    y=alt.Y("指标:N", sort=INDICATORS),
+                    color=alt.Color("次数:Q", scale=alt.Scale(scheme="oranges")),
+                    column=alt.Column("后续期:N"),
+                    tooltip=["后续期", "指标", "数字", "次数"],
+                )
+                st.altair_chart(successor_chart)
+                st.dataframe(
+                    successor_df.pivot(index=["后续期", "指标"], columns="数字", values="次数").reindex(INDICATORS, level=1),
+                    use_container_width=True,
+                )
         else:
-            st.warning("未找到匹配记录。")
+            pages = page_count(len(results))
+            page = st.selectbox(f"页码（共{pages}页，每页{PAGE_SIZE}条）", range(1, pages + 1), key=f"page_{ind}_{query}")
+            # 大标题高亮，子项目缩进，命中数字大红色
+            st.markdown(f'<div style="font-size:28px;font-weight:bold;color:#0074D9;margin-top:32px;margin-bottom:12px;">{ind} 匹配区间明细表：</div>', unsafe_allow_html=True)
+            with timer.stage("render"):
+                page_html = results_page_html(store, ind, results, page)
+                st.markdown(page_html, unsafe_allow_html=True)
+            html_bytes = len(page_html.encode("utf-8"))
+            shown = len(results[(page - 1) * PAGE_SIZE:page * PAGE_SIZE])
+    else:
+        st.warning("未找到匹配记录。")
+    
+    # 数据与查询缓存为进程级共享，会话中只保存查询参数与页码
+    memory = store.memory_usage()
+    timer.count(
+        rows=len(store),
+        store_data_bytes=memory["data_bytes"],
+        store_index_bytes=memory["index_bytes"],
+        store_mmap=memory["mmap"],
+        session_bytes=session_state_bytes(st.session_state),
+        peak_rss_bytes=peak_rss_bytes(),
+        matches=sum(len(r) for r in all_results.values()),
+        shown_matches=shown,
+        html_bytes=html_bytes,
+        cache_hits=info["hits"],
+        cache_misses=info["misses"],
+        cache_size=info["size"],
+    )
+    timer.log(logger, dataset=dataset.key, indicator=q_indicator, seq=q_seq, mode=q_mode, version=store.version)
+    if profiler is not None:
+        profile_path = stop_profile(profiler, log_dir)
+        logger.info(f'cProfile 已写入 {profile_path}')
+        st.sidebar.success(f"cProfile 已写入 {profile_path}")
+    if show_perf:
+        with st.expander("性能", expanded=True):
+            st.json(timer.as_dict())
 else:
-    st.info("请输入2位及以上的连续号码后点击查询。") 
\ No newline at end of file
+    st.info("请输入2位及以上的连续号码（或通配/组合条件）后点击查询。")
+
+# 遗漏与频率统计：使用预先计算、随每日更新增量维护的统计，页面加载时不扫描历史
+with st.expander("遗漏与频率统计"):
+    stats_store = get_store(dataset=dataset)
+    if not len(stats_store):
+        st.warning(f"暂无{dataset.name}数据，请先运行 python p3_spider.py update_all --dataset={dataset.key}")
+        st.stop()
+    stats = get_stats(stats_store)
+    stats_ind = st.selectbox("统计指标", INDICATORS, key="stats_indicator")
+    stats_df = pd.DataFrame(stats.table(stats_ind))
+    recent_col = f"近{stats.recent_n}期次数"
+    st.caption(f"截至第{stats.last_issue}期，共{stats.total}期")
+    omission_df = stats_df.melt("数字", ["当前遗漏", "最大遗漏"], var_name="类型", value_name="期数")
+    omission_chart = alt.Chart(omission_df).mark_bar().encode(
+        x=alt.X("数字:O"),
+        y=alt.Y("期数:Q"),
+        color=alt.Color("类型:N"),
+        xOffset="类型:N",
+        tooltip=["数字", "类型", "期数"],
+    ).properties(title=f"{stats_ind} 当前遗漏与最大遗漏")
+    st.altair_chart(omission_chart, use_container_width=True)
+    frequency_chart = alt.Chart(stats_df).mark_bar(color="#0074D9").encode(
+        x=alt.X("数字:O"),
+        y=alt.Y(f"{recent_col}:Q"),
+        tooltip=["数字", recent_col],
+    ).properties(title=f"{stats_ind} {recent_col}")
+    st.altair_chart(frequency_chart, use_container_width=True)
+    st.dataframe(stats_df, hide_index=True, use_container_width=True)
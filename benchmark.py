@@ -0,0 +1,156 @@
+"""查询与渲染性能基准
+
+生成与 sort3_YYYY.csv 相同格式的合成历史数据（默认为现有约7300期的10/100/1000倍），
+分别计时加载、匹配和结果渲染，结果以 JSON 输出，便于在不同提交之间比较。无需启动 Streamlit。
+
+用法:
+  python benchmark.py                          # 全部规模，结果输出到标准输出
+  python benchmark.py --scales 10,100 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from history_store import load_history_csv, load_snapshot, write_snapshot
+from query_engine import INDICATORS, MODE_DIRECTIONS, search
+from result_render import PAGE_SIZE, results_page_html, summarize
+
+# 现有历史数据的期数，作为放大倍数的基准
+BASE_ROWS = 7300
+ROWS_PER_YEAR = 358
+# 合成数据的起始年份，取五位数保证文件名按年份排序
+FIRST_YEAR = 10000
+PATTERN_LENGTHS = range(2, 9)
+
+
+def generate_history(data_dir, rows, seed=0):
+    """按 sort3_YYYY.csv 的格式写入 rows 期随机开奖数据"""
+    rng = np.random.default_rng(seed)
+    digits = rng.integers(0, 10, size=(rows, 3))
+    sums = digits.sum(axis=1)
+    gaps = digits.max(axis=1) - digits.min(axis=1)
+    for start in range(0, rows, ROWS_PER_YEAR):
+        year = FIRST_YEAR + start // ROWS_PER_YEAR
+        end = min(start + ROWS_PER_YEAR, rows)
+        lines = ["issue,prize,hundred,ten,unit,sum,tail,gap"]
+        for i in range(start, end):
+            h, t, u = digits[i]
+            lines.append(f"{year * 1000 + i - start + 1},{h}{t}{u},{h},{t},{u},{sums[i]},{sums[i] % 10},{gaps[i]}")
+        with open(os.path.join(data_dir, f"sort3_{year}.csv"), "w", encoding="utf-8-sig", newline="") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def timed(func, repeat):
+    """执行 repeat 次，返回 (最后一次结果, 耗时统计)"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return result, {"min_ms": round(min(durations) * 1000, 3), "median_ms": round(statistics.median(durations) * 1000, 3)}
+
+
+def bench_load(data_dir, repeat):
+    csv_store, csv_time = timed(lambda: load_history_csv(data_dir), repeat)
+    _, write_time = timed(lambda: write_snapshot(csv_store, data_dir), 1)
+    _, mmap_time = timed(lambda: load_snapshot(data_dir), repeat)
+    return csv_store, {"csv": csv_time, "snapshot_write": write_time, "snapshot_mmap": mmap_time}
+
+
+def bench_match(store, repeat, rng):
+    results = []
+    for length in PATTERN_LENGTHS:
+        seq = "".join(str(d) for d in rng.integers(0, 10, size=length))
+        for mode in MODE_DIRECTIONS:
+            for scope, indicators in [("单指标", ["百位"]), ("全部", INDICATORS)]:
+                hits, timing = timed(lambda: search(store, seq, indicators, mode), repeat)
+                results.append({
+                    "length": length,
+                    "seq": seq,
+                    "mode": mode,
+                    "scope": scope,
+                    "matches": sum(len(r) for r in hits.values()),
+                    **timing,
+                })
+    return results
+
+
+def bench_render(store, repeat):
+    all_results = search(store, "12", INDICATORS, "双向查找")
+    results = all_results["百位"]
+    first_page, page_time = timed(lambda: results_page_html(store, "百位", results, 1), repeat)
+    _, summary_time = timed(lambda: summarize(all_results), repeat)
+    pages = (len(results) + PAGE_SIZE - 1) // PAGE_SIZE
+    full, full_time = timed(
+        lambda: "".join(results_page_html(store, "百位", results, p) for p in range(1, pages + 1)), 1
+    )
+    return {
+        "seq": "12",
+        "matches": len(results),
+        "summary": summary_time,
+        "first_page": {**page_time, "bytes": len(first_page.encode("utf-8"))},
+        "all_pages": {**full_time, "bytes": len(full.encode("utf-8"))},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales, repeat, seed=0):
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "repeat": repeat,
+        "scales": [],
+    }
+    rng = np.random.default_rng(seed)
+    for scale in scales:
+        rows = BASE_ROWS * scale
+        with tempfile.TemporaryDirectory(prefix="sort3_bench_") as data_dir:
+            _, gen_time = timed(lambda: generate_history(data_dir, rows, seed), 1)
+            store, load = bench_load(data_dir, repeat)
+            report["scales"].append({
+                "scale": scale,
+                "rows": rows,
+                "generate": gen_time,
+                "load": load,
+                "match": bench_match(store, repeat, rng),
+                "render": bench_render(store, repeat),
+            })
+        print(f"{scale}x ({rows}期) 完成", file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排列三查询与渲染性能基准")
+    parser.add_argument("--scales", default="10,100,1000", help="相对现有数据量的放大倍数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每项计时重复次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON 输出文件，缺省输出到标准输出")
+    args = parser.parse_args(argv)
+    report = run([int(x) for x in args.scales.split(",") if x], args.repeat, args.seed)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
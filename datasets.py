@@ -0,0 +1,105 @@
+import os
+
+
+class Dataset:
+    """一种数字型彩票的数据定义：号码位数、派生指标、文件命名和抓取来源
+
+    存储、匹配、统计和爬虫各层都以 Dataset 为参数，不同彩种的文件以 key 为前缀放在同一数据目录下。
+    """
+
+    def __init__(self, key, name, positions, url, first_year, url_env=None):
+        self.key = key                  # 文件名前缀，如 sort3 -> sort3_2025.csv
+        self.name = name
+        self.positions = positions      # [(指标名, 列名), ...]，按奖号从左到右
+        # 走势图地址，可通过环境变量指向本地 HTML 夹具（如 file:///path/chzs.htm）进行测试
+        self.url = os.environ.get(url_env or f'{key.upper()}_CHART_URL', url)
+        self.first_year = first_year
+
+    @property
+    def digits(self):
+        return len(self.positions)
+
+    @property
+    def position_columns(self):
+        return [col for _, col in self.positions]
+
+    @property
+    def columns(self):
+        """存储的整数列：各位数字及和值、和尾、跨度"""
+        return self.position_columns + ['sum', 'tail', 'gap']
+
+    @property
+    def csv_columns(self):
+        return ['issue', 'prize'] + self.columns
+
+    @property
+    def col_map(self):
+        """指标名 -> 列名"""
+        return {"和尾": "tail", "跨度": "gap", **dict(self.positions)}
+
+    @property
+    def indicators(self):
+        return ["和尾", "跨度"] + [label for label, _ in self.positions]
+
+    @property
+    def file_pattern(self):
+        return f'{self.key}_*.csv'
+
+    def file_path(self, data_dir, year):
+        return os.path.join(data_dir, f'{self.key}_{year}.csv')
+
+    def data_file(self, data_dir, suffix):
+        """该彩种的快照、统计、通知等附属文件"""
+        return os.path.join(data_dir, f'{self.key}_{suffix}')
+
+    def derive(self, digits):
+        """由各位数字计算和值、和尾、跨度"""
+        values = [int(d) for d in digits]
+        sum_value = sum(values)
+        return sum_value, sum_value % 10, max(values) - min(values)
+
+    def record(self, issue, prize):
+        """一期开奖的 CSV 记录"""
+        sum_value, tail, gap = self.derive(prize)
+        row = {"issue": issue, "prize": prize}
+        row.update({col: prize[i] for i, col in enumerate(self.position_columns)})
+        row.update({"sum": sum_value, "tail": tail, "gap": gap})
+        return row
+
+
+SORT3 = Dataset(
+    key='sort3',
+    name='排列三',
+    positions=[("百位", "hundred"), ("十位", "ten"), ("个位", "unit")],
+    url="https://www.00038.cn/zs_p3/chzs.htm",
+    first_year=2004,
+    url_env='P3_CHART_URL',
+)
+FC3D = Dataset(
+    key='fc3d',
+    name='福彩3D',
+    positions=[("百位", "hundred"), ("十位", "ten"), ("个位", "unit")],
+    url="https://www.00038.cn/zs_3d/chzs.htm",
+    first_year=2004,
+)
+SORT5 = Dataset(
+    key='sort5',
+    name='排列五',
+    positions=[("万位", "wan"), ("千位", "qian"), ("百位", "hundred"), ("十位", "ten"), ("个位", "unit")],
+    url="https://www.00038.cn/zs_p5/chzs.htm",
+    first_year=2004,
+)
+
+DATASETS = {dataset.key: dataset for dataset in [SORT3, FC3D, SORT5]}
+DEFAULT_DATASET = SORT3
+
+
+def get_dataset(dataset=None):
+    """按 key 取数据定义，传入 Dataset 时原样返回，缺省为排列三"""
+    if dataset is None:
+        return DEFAULT_DATASET
+    if isinstance(dataset, Dataset):
+        return dataset
+    if dataset not in DATASETS:
+        raise ValueError(f"未知数据集: {dataset}")
+    return DATASETS[dataset]
@@ -0,0 +1,330 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from datasets import get_dataset
+
+DATA_DIR = 'data'
+# 二进制快照：按列存储的 uint8 矩阵、uint32 期号索引，以及描述来源CSV的元数据，文件名前加彩种前缀
+SNAPSHOT_COLUMNS = 'columns.npy'
+SNAPSHOT_ISSUES = 'issues.npy'
+SNAPSHOT_META = 'snapshot.json'
+# 爬虫每次更新完成后写入的通知文件
+MANIFEST_FILE = 'manifest.json'
+
+logger = logging.getLogger('sort3')
+
+
+class HistoryStore:
+    """按期号顺序拼接的连续时间线，所有列均为紧凑整数数组
+
+    数组一律只读：进程内所有会话共享同一份，来自快照时为内存映射，多个工作进程共享操作系统页缓存。
+    """
+
+    def __init__(self, issue, columns, years, offsets, files, signature, dataset=None):
+        self.dataset = get_dataset(dataset)
+        self.issue = _readonly(issue)  # uint32，期号
+        self.columns = {name: _readonly(values) for name, values in columns.items()}  # 列名 -> uint8 数组
+        self.years = years          # 年份字符串列表，与 files 一一对应
+        self.offsets = offsets      # 每年起始行号，长度为 len(years) + 1
+        self.files = files
+        self.signature = signature  # 加载时各文件的 (路径, mtime, 大小)
+        self.version = data_version(signature, self.dataset)
+        self.manifest_mtime = None  # 加载时通知文件的 mtime，用于热加载判断
+        self._index = {}            # 列名 -> (按数字分组的行号, 分组边界)
+
+    def __len__(self):
+        return len(self.issue)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def digit_positions(self, name, digit):
+        """列 name 中等于 digit 的所有行号（升序），首次访问时建立索引"""
+        index = self._index.get(name)
+        if index is None:
+            values = self.columns[name]
+            order = _readonly(np.argsort(values, kind='stable').astype(np.uint32))
+            bounds = np.searchsorted(values[order], np.arange(int(values.max(initial=0)) + 2))
+            index = (order, bounds)
+            self._index[name] = index
+        order, bounds = index
+        if digit < 0 or digit + 1 >= len(bounds):
+            return np.empty(0, dtype=np.int64)
+        # 索引以 uint32 存储，取出时转为 int64 以便做带符号的偏移运算
+        return order[bounds[digit]:bounds[digit + 1]].astype(np.int64)
+
+    def memory_usage(self):
+        """数据与索引占用的字节数；mmap 为 True 时数据列由操作系统页缓存在进程间共享"""
+        data_bytes = self.issue.nbytes + sum(values.nbytes for values in self.columns.values())
+        index_bytes = sum(order.nbytes + bounds.nbytes for order, bounds in self._index.values())
+        return {
+            "rows": len(self),
+            "data_bytes": int(data_bytes),
+            "index_bytes": int(index_bytes),
+            "mmap": isinstance(self.issue, np.memmap),
+        }
+
+
+def _readonly(values):
+    if values.flags.writeable:
+        values.setflags(write=False)
+    return values
+
+
+def _year_of(path):
+    return os.path.basename(path).split("_")[1].split(".")[0]
+
+
+def data_signature(data_dir=DATA_DIR, dataset=None):
+    """数据文件签名，文件增删或 mtime 变化时签名随之变化"""
+    dataset = get_dataset(dataset)
+    # 按年份排序，拼接后即为按期号排序的全局时间线
+    files = sorted(glob.glob(os.path.join(data_dir, dataset.file_pattern)), key=_year_of)
+    signature = []
+    for path in files:
+        st = os.stat(path)
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def data_version(signature, dataset=None):
+    """由彩种和文件签名得到的数据版本号，任一文件被重写后版本随之改变"""
+    key = (get_dataset(dataset).key, signature)
+    return hashlib.md5(repr(key).encode('utf-8')).hexdigest()[:12]
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def _snapshot_key(signature):
+    # 快照比较文件名、大小和内容哈希，不比较 mtime：检出、打包解压都会改变 mtime；
+    # 原地修正某期数据时文件大小可能不变，需要内容哈希识别（全部CSV约600KB，哈希开销很小）
+    return [[os.path.basename(path), size, _file_hash(path)] for path, _, size in signature]
+
+
+def load_history_csv(data_dir=DATA_DIR, signature=None, dataset=None):
+    """一次性解析全部CSV为整数数组"""
+    dataset = get_dataset(dataset)
+    if signature is None:
+        signature = data_signature(data_dir, dataset)
+    files = [path for path, _, _ in signature]
+    issues = []
+    columns = {name: [] for name in dataset.columns}
+    years = []
+    offsets = [0]
+    for path in files:
+        df = pd.read_csv(path, encoding='utf-8-sig', usecols=['issue'] + dataset.columns)
+        issues.append(df['issue'].to_numpy(dtype=np.uint32))
+        for name in dataset.columns:
+            columns[name].append(df[name].to_numpy(dtype=np.uint8))
+        years.append(_year_of(path))
+        offsets.append(offsets[-1] + len(df))
+
+    def _concat(parts, dtype):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    issue = _concat(issues, np.uint32)
+    columns = {name: _concat(parts, np.uint8) for name, parts in columns.items()}
+    if np.any(issue[1:] < issue[:-1]):
+        # 旧版爬虫可能未按期号顺序写入；文件按年份排序，整体按期号稳定排序后各年份的 offsets 不变
+        logger.warning(f'{dataset.name}数据文件中的期号未按顺序排列，已按期号重新排序')
+        order = np.argsort(issue, kind='stable')
+        issue = issue[order]
+        columns = {name: values[order] for name, values in columns.items()}
+
+    return HistoryStore(
+        issue=issue,
+        columns=columns,
+        years=years,
+        offsets=np.asarray(offsets, dtype=np.int64),
+        files=files,
+        signature=signature,
+        dataset=dataset,
+    )
+
+
+def write_snapshot(store, data_dir=DATA_DIR):
+    """将历史数据写为二进制快照，先写临时文件再原子替换，元数据最后写入"""
+    dataset = store.dataset
+    matrix = np.stack([store.columns[name] for name in dataset.columns]) if len(store) else \
+        np.empty((len(dataset.columns), 0), dtype=np.uint8)
+    meta = {
+        "columns": dataset.columns,
+        "rows": len(store),
+        "years": store.years,
+        "offsets": [int(x) for x in store.offsets],
+        "files": _snapshot_key(store.signature),
+    }
+    try:
+        for name, array in [(SNAPSHOT_COLUMNS, matrix), (SNAPSHOT_ISSUES, store.issue)]:
+            path = dataset.data_file(data_dir, name)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(path + '.tmp', path)
+        path = dataset.data_file(data_dir, SNAPSHOT_META)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f'写入二进制快照失败: {e}')
+        return False
+    return True
+
+
+def load_snapshot(data_dir=DATA_DIR, signature=None, dataset=None):
+    """内存映射二进制快照；快照缺失、与CSV不一致或损坏时返回 None"""
+    dataset = get_dataset(dataset)
+    if signature is None:
+        signature = data_signature(data_dir, dataset)
+    try:
+        with open(dataset.data_file(data_dir, SNAPSHOT_META), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta["columns"] != dataset.columns or meta["files"] != _snapshot_key(signature):
+            return None
+        matrix = np.load(dataset.data_file(data_dir, SNAPSHOT_COLUMNS), mmap_mode='r')
+        issue = np.load(dataset.data_file(data_dir, SNAPSHOT_ISSUES), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+    rows = meta["rows"]
+    if matrix.shape != (len(dataset.columns), rows) or issue.shape != (rows,):
+        return None
+    return HistoryStore(
+        issue=issue,
+        columns={name: matrix[i] for i, name in enumerate(dataset.columns)},
+        years=meta["years"],
+        offsets=np.asarray(meta["offsets"], dtype=np.int64),
+        files=[path for path, _, _ in signature],
+        signature=signature,
+        dataset=dataset,
+    )
+
+
+def load_history(data_dir=DATA_DIR, signature=None, dataset=None):
+    """优先内存映射二进制快照，快照缺失或过期时解析CSV并重建快照"""
+    dataset = get_dataset(dataset)
+    if signature is None:
+        signature = data_signature(data_dir, dataset)
+    store = load_snapshot(data_dir, signature, dataset)
+    if store is None:
+        store = load_history_csv(data_dir, signature, dataset)
+        # 尚无数据的彩种不写空快照
+        if signature:
+            write_snapshot(store, data_dir)
+    return store
+
+
+def append_draws(store, year, path, rows, signature):
+    """在已有数据末尾追加同一年份的若干期新数据（已按期号排序），返回新的 HistoryStore"""
+    year = str(year)
+    years = list(store.years)
+    offsets = [int(x) for x in store.offsets]
+    files = list(store.files)
+    if not years or years[-1] != year:
+        years.append(year)
+        offsets.append(offsets[-1])
+        files.append(path)
+    offsets[-1] += len(rows)
+    issue = np.concatenate([store.issue, np.asarray([int(r["issue"]) for r in rows], dtype=np.uint32)])
+    columns = {
+        name: np.concatenate([store.columns[name], np.asarray([int(r[name]) for r in rows], dtype=np.uint8)])
+        for name in store.dataset.columns
+    }
+    return HistoryStore(issue, columns, years, np.asarray(offsets, dtype=np.int64), files, signature, store.dataset)
+
+
+def refresh_snapshot(data_dir=DATA_DIR, dataset=None):
+    """数据文件更新后由爬虫调用，从CSV重建二进制快照，返回新的 HistoryStore"""
+    store = load_history_csv(data_dir, dataset=dataset)
+    write_snapshot(store, data_dir)
+    return store
+
+
+def write_manifest(store, data_dir=DATA_DIR):
+    """爬虫完成一次更新（CSV、快照、统计均已写好）后原子写入通知文件，应用据此热加载"""
+    manifest = {
+        "version": store.version,
+        "rows": len(store),
+        "last_issue": int(store.issue[-1]) if len(store) else None,
+        "updated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    path = store.dataset.data_file(data_dir, MANIFEST_FILE)
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f'写入数据通知文件失败: {e}')
+        return False
+    return True
+
+
+def _manifest_mtime(data_dir, dataset):
+    try:
+        return os.stat(dataset.data_file(data_dir, MANIFEST_FILE)).st_mtime_ns
+    except OSError:
+        return None
+
+
+# 进程内共享的缓存，Streamlit 所有会话和重跑共用同一份数据；各彩种按 (数据目录, key) 分别缓存
+_stores = {}
+_reloading = set()
+_lock = threading.Lock()
+
+
+def _reload_in_background(data_dir, dataset, manifest_mtime):
+    """后台重建并替换共享数据；进行中的查询仍持有旧 store，不受影响"""
+    cache_key = (data_dir, dataset.key)
+    with _lock:
+        if cache_key in _reloading:
+            return
+        _reloading.add(cache_key)
+
+    def run():
+        try:
+            store = load_history(data_dir, dataset=dataset)
+            store.manifest_mtime = manifest_mtime
+            _stores[cache_key] = store
+            logger.info(f'{dataset.name}数据已热加载，版本{store.version}，共{len(store)}期')
+        except Exception as e:
+            logger.warning(f'热加载{dataset.name}数据失败: {e}')
+        finally:
+            with _lock:
+                _reloading.discard(cache_key)
+
+    threading.Thread(target=run, name=f'{dataset.key}-reload', daemon=True).start()
+
+
+def get_store(data_dir=DATA_DIR, dataset=None):
+    """返回共享的历史数据
+
+    有通知文件时每次只 stat 该文件，发现变化后在后台重建并替换，当前请求继续使用旧数据；
+    没有通知文件时按各数据文件的签名判断，变化时同步重新加载。
+    """
+    dataset = get_dataset(dataset)
+    cache_key = (data_dir, dataset.key)
+    manifest_mtime = _manifest_mtime(data_dir, dataset)
+    store = _stores.get(cache_key)
+    if store is not None and manifest_mtime is not None:
+        if store.manifest_mtime != manifest_mtime:
+            _reload_in_background(data_dir, dataset, manifest_mtime)
+        return store
+    signature = data_signature(data_dir, dataset)
+    if store is not None and store.signature == signature:
+        return store
+    with _lock:
+        store = _stores.get(cache_key)
+        if store is None or store.signature != signature:
+            store = load_history(data_dir, signature, dataset)
+            store.manifest_mtime = manifest_mtime
+            _stores[cache_key] = store
+        return store
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+from datasets import get_dataset
+from history_store import DATA_DIR
+
+# 文件名前加彩种前缀，如 sort3_stats.json
+STATS_FILE = 'stats.json'
+# 近 N 期出现次数的统计窗口
+RECENT_N = 100
+
+
+class OmissionStats:
+    """各指标各数字的当前遗漏、历史最大遗漏和近 N 期出现次数，每新增一期 O(1) 更新"""
+
+    def __init__(self, recent_n=RECENT_N, dataset=None):
+        self.dataset = get_dataset(dataset)
+        self.recent_n = recent_n
+        self.total = 0
+        self.last_issue = None
+        indicators = self.dataset.indicators
+        self.last_seen = {ind: [-1] * 10 for ind in indicators}     # 最近一次出现的行号
+        self.max_omission = {ind: [0] * 10 for ind in indicators}   # 已结束的遗漏区间中的最大值
+        self.recent = {ind: deque() for ind in indicators}          # 近 N 期的数字
+        self.recent_counts = {ind: [0] * 10 for ind in indicators}
+
+    @classmethod
+    def from_store(cls, store, recent_n=RECENT_N):
+        """从全部历史一次性向量化构建"""
+        stats = cls(recent_n, store.dataset)
+        stats.total = len(store)
+        stats.last_issue = int(store.issue[-1]) if len(store) else None
+        for ind, col in stats.dataset.col_map.items():
+            for d in range(10):
+                positions = store.digit_positions(col, d)
+                if len(positions):
+                    gaps = np.diff(positions, prepend=-1) - 1
+                    stats.max_omission[ind][d] = int(gaps.max())
+                    stats.last_seen[ind][d] = int(positions[-1])
+            recent = store.column(col)[-recent_n:].tolist() if recent_n else []
+            stats.recent[ind] = deque(recent)
+            stats.recent_counts[ind] = np.bincount(recent, minlength=10)[:10].tolist()
+        return stats
+
+    def add(self, issue, values):
+        """追加一期，values 为 列名 -> 数字"""
+        t = self.total
+        for ind, col in self.dataset.col_map.items():
+            v = int(values[col])
+            last_seen = self.last_seen[ind]
+            self.max_omission[ind][v] = max(self.max_omission[ind][v], t - last_seen[v] - 1)
+            last_seen[v] = t
+            recent = self.recent[ind]
+            recent.append(v)
+            self.recent_counts[ind][v] += 1
+            if len(recent) > self.recent_n:
+                self.recent_counts[ind][recent.popleft()] -= 1
+        self.total = t + 1
+        self.last_issue = int(issue)
+
+    def current_omission(self, ind, digit):
+        return self.total - 1 - self.last_seen[ind][digit]
+
+    def table(self, ind):
+        """某个指标 0-9 各数字的统计行"""
+        rows = []
+        for d in range(10):
+            current = self.current_omission(ind, d)
+            rows.append({
+                "数字": d,
+                "当前遗漏": current,
+                "最大遗漏": max(self.max_omission[ind][d], current),
+                f"近{self.recent_n}期次数": self.recent_counts[ind][d],
+            })
+        return rows
+
+    def to_dict(self):
+        return {
+            "dataset": self.dataset.key,
+            "recent_n": self.recent_n,
+            "total": self.total,
+            "last_issue": self.last_issue,
+            "last_seen": self.last_seen,
+            "max_omission": self.max_omission,
+            "recent": {ind: list(values) for ind, values in self.recent.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data["recent_n"], data.get("dataset"))
+        stats.total = data["total"]
+        stats.last_issue = data["last_issue"]
+        stats.last_seen = {ind: list(values) for ind, values in data["last_seen"].items()}
+        stats.max_omission = {ind: list(values) for ind, values in data["max_omission"].items()}
+        for ind, values in data["recent"].items():
+            stats.recent[ind] = deque(values)
+            stats.recent_counts[ind] = np.bincount(values, minlength=10)[:10].tolist()
+        return stats
+
+
+def load_stats_file(data_dir=DATA_DIR, dataset=None):
+    dataset = get_dataset(dataset)
+    try:
+        with open(dataset.data_file(data_dir, STATS_FILE), encoding='utf-8') as f:
+            stats = OmissionStats.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    return stats if stats.dataset is dataset else None
+
+
+def save_stats_file(stats, data_dir=DATA_DIR):
+    path = stats.dataset.data_file(data_dir, STATS_FILE)
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(), f)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        return False
+    return True
+
+
+def sync_stats(store, stats=None, recent_n=RECENT_N):
+    """让统计与 store 对齐：stats 是 store 的前缀时只补算新增的期，否则整体重建"""
+    if stats is not None and stats.dataset is store.dataset and stats.recent_n == recent_n \
+            and 0 < stats.total <= len(store) and int(store.issue[stats.total - 1]) == stats.last_issue:
+        columns = {col: store.column(col) for col in store.dataset.col_map.values()}
+        for t in range(stats.total, len(store)):
+            stats.add(store.issue[t], {col: values[t] for col, values in columns.items()})
+        return stats
+    return OmissionStats.from_store(store, recent_n)
+
+
+def update_stats_file(store, data_dir=DATA_DIR, rebuild=False):
+    """爬虫追加新数据后调用：读取已保存的统计，只补算新增的期后写回；rebuild 为 True 时（已有数据被改写）整体重建"""
+    stats = sync_stats(store, None if rebuild else load_stats_file(data_dir, store.dataset))
+    save_stats_file(stats, data_dir)
+    return stats
+
+
+# 进程内共享，按 (数据目录, 彩种) 缓存，数据版本变化时补算
+_stats = {}
+_lock = threading.Lock()
+
+
+def get_stats(store, data_dir=DATA_DIR):
+    """返回与 store 对应的统计；优先使用爬虫保存的统计文件，页面加载时不扫描历史"""
+    cache_key = (data_dir, store.dataset.key)
+    stats = _stats.get(cache_key)
+    if stats is not None and stats[0] == store.version:
+        return stats[1]
+    with _lock:
+        stats = _stats.get(cache_key)
+        if stats is None or stats[0] != store.version:
+            # 复制一份再补算，正在使用旧统计的会话不受影响
+            previous = OmissionStats.from_dict(stats[1].to_dict()) if stats is not None else load_stats_file(data_dir, store.dataset)
+            previous_total = previous.total if previous is not None else None
+            stats = (store.version, sync_stats(store, previous))
+            if previous_total != stats[1].total and len(store):
+                save_stats_file(stats[1], data_dir)
+            _stats[cache_key] = stats
+        return stats[1]
@@ -0,0 +1,72 @@
+import argparse
+import json
+import sys
+
+from datasets import DATASETS, get_dataset
+from history_store import DATA_DIR
+from query_engine import MODE_DIRECTIONS, Sort3Engine, is_valid_query
+
+
+def read_patterns(stream, dataset=None):
+    """每行一个号码或通配/组合条件，跳过空行和非法查询"""
+    for line_no, line in enumerate(stream, 1):
+        seq = line.strip()
+        if not seq:
+            continue
+        if not is_valid_query(seq, dataset=dataset):
+            print(f"第{line_no}行号码无效，已跳过: {seq}", file=sys.stderr)
+            continue
+        yield seq
+
+
+def result_records(engine, patterns, indicators, mode, count_only):
+    """逐个号码产出一行 JSON 记录"""
+    if count_only:
+        for seq, starts in engine.iter_starts(patterns, indicators, mode):
+            yield {
+                "pattern": seq,
+                "counts": {ind: {d: len(hits) for d, hits in by_dir.items()} for ind, by_dir in starts.items()},
+            }
+    else:
+        for seq, all_results in engine.iter_search(patterns, indicators, mode):
+            yield {
+                "pattern": seq,
+                "matches": {
+                    ind: [{"year": year, "issues": issues, "mode": m} for year, issues, m, _, _ in results]
+                    for ind, results in all_results.items()
+                },
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="历史号码连续查询（命令行批量模式），结果按 JSONL 逐行输出")
+    parser.add_argument("patterns", help="号码文件，每行一个号码；- 表示标准输入")
+    parser.add_argument("--dataset", default="sort3", choices=list(DATASETS), help="彩种，默认排列三")
+    parser.add_argument("--indicators", help="逗号分隔的指标，默认该彩种全部指标")
+    parser.add_argument("--mode", default="双向查找", choices=list(MODE_DIRECTIONS))
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--count-only", action="store_true", help="只输出各指标、各方向的匹配数")
+    parser.add_argument("--output", help="输出文件，缺省输出到标准输出")
+    args = parser.parse_args(argv)
+
+    dataset = get_dataset(args.dataset)
+    indicators = [i for i in args.indicators.split(",") if i] if args.indicators else dataset.indicators
+    unknown = [i for i in indicators if i not in dataset.indicators]
+    if unknown:
+        parser.error(f"未知指标: {','.join(unknown)}，{dataset.name}可用: {','.join(dataset.indicators)}")
+
+    engine = Sort3Engine(data_dir=args.data_dir, dataset=dataset)
+    source = sys.stdin if args.patterns == "-" else open(args.patterns, encoding="utf-8-sig")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for record in result_records(engine, read_patterns(source, dataset), indicators, args.mode, args.count_only):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
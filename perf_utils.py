@@ -0,0 +1,74 @@
+import cProfile
+import json
+import os
+import pickle
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class QueryTimer:
+    """记录一次查询各阶段的耗时和计数，输出为结构化日志"""
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    def as_dict(self):
+        return {
+            "stages_ms": dict(self.stages),
+            "total_ms": round(sum(self.stages.values()), 3),
+            **self.counts,
+        }
+
+    def log(self, logger, **context):
+        logger.info('query_perf ' + json.dumps({**context, **self.as_dict()}, ensure_ascii=False))
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler, log_dir='log'):
+    """停止 cProfile 并写入 log 目录，返回 .prof 文件路径"""
+    profiler.disable()
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def session_state_bytes(state):
+    """会话状态的近似字节数，按 pickle 序列化大小估算"""
+    total = 0
+    for key in list(state.keys()):
+        try:
+            total += len(pickle.dumps(state[key]))
+        except Exception:
+            total += sys.getsizeof(state[key])
+    return total
+
+
+def peak_rss_bytes():
+    """进程峰值常驻内存；不支持 resource 模块的平台（Windows）返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return rss if sys.platform == 'darwin' else rss * 1024
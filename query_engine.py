@@ -0,0 +1,407 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from datasets import SORT3, get_dataset
+from history_store import DATA_DIR, get_store
+
+# 排列三的指标映射；其他彩种使用 store.dataset.indicators / col_map
+INDICATORS = SORT3.indicators
+COL_MAP = SORT3.col_map
+# 查找模式 -> 需要匹配的方向
+MODE_DIRECTIONS = {
+    "顺序查找": ["顺序"],
+    "逆序查找": ["逆序"],
+    "双向查找": ["顺序", "逆序"],
+}
+# 组合条件查询结果的键
+COMBINED = "组合条件"
+# 单指标通配查询的记号：数字、?、*、[数字集合]
+PATTERN_TOKEN = re.compile(r'\[[0-9\-]+\]|[0-9?*]')
+PATTERN_SET_PART = re.compile(r'[0-9]-[0-9]|[0-9]')
+# 通配/组合条件查询至少需要的确定条件数（不含 ? 和 [0-9]）
+MIN_CONDITIONS = 2
+# 批量查询时可编码为 int64 窗口值的最大号码长度
+MAX_CODE_LENGTH = 18
+# 后续分布统计的期数
+SUCCESSOR_STEPS = 3
+# 查询结果缓存的最大条目数
+QUERY_CACHE_SIZE = 256
+
+
+class QueryCache:
+    """有界 LRU 查询缓存，键为 (彩种, 指标集合, 号码, 查找模式, 数据版本)"""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._versions = {}  # 彩种 -> 当前数据版本
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        dataset, version = key[0], key[-1]
+        with self._lock:
+            # 某彩种数据版本变化（如每日更新写入新数据）时丢弃该彩种旧版本的全部结果
+            if self._versions.get(dataset) != version:
+                for old in [k for k in self._data if k[0] == dataset]:
+                    del self._data[old]
+                self._versions[dataset] = version
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_query_cache = QueryCache()
+
+
+class PatternError(ValueError):
+    """无法解析的通配/组合条件查询"""
+
+
+def match_starts(store, col, pattern):
+    """返回 pattern 在列 col 中所有出现位置的起始行号（升序），在全部历史的连续时间线上匹配，可跨年"""
+    values = store.column(col)
+    n = len(pattern)
+    if n == 0 or n > len(values):
+        return np.empty(0, dtype=np.int64)
+    # 从出现次数最少的数字开始，用位置索引生成候选起点，再逐位过滤
+    k0 = min(range(n), key=lambda k: len(store.digit_positions(col, pattern[k])))
+    cand = store.digit_positions(col, pattern[k0]) - k0
+    cand = cand[(cand >= 0) & (cand <= len(values) - n)]
+    for k, digit in enumerate(pattern):
+        if k == k0:
+            continue
+        if not len(cand):
+            break
+        cand = cand[values[cand + k] == digit]
+    return cand
+
+
+def build_span_results(store, spans_by_direction):
+    """把各方向的命中区间 (起点数组, 终点数组，含终点) 转换为 [(year, issues, mode, idxs, file), ...]"""
+    directions = list(spans_by_direction)
+    starts = np.concatenate([np.asarray(spans_by_direction[d][0], dtype=np.int64) for d in directions])
+    ends = np.concatenate([np.asarray(spans_by_direction[d][1], dtype=np.int64) for d in directions])
+    modes = np.concatenate([np.full(len(spans_by_direction[d][0]), m) for m, d in enumerate(directions)])
+    year_idx = np.searchsorted(store.offsets, starts, side='right') - 1
+    # 按年份、方向、起点排序，与逐年逐方向扫描的顺序一致
+    order = np.lexsort((starts, modes, year_idx))
+    starts, ends, modes, year_idx = starts[order], ends[order], modes[order], year_idx[order]
+    end_idx = np.searchsorted(store.offsets, ends, side='right') - 1
+    lengths = ends - starts + 1
+    if len(starts) and (lengths == lengths[0]).all():
+        # 定长命中一次性取出所有区间的期号
+        issues = store.issue[starts[:, None] + np.arange(lengths[0])].tolist()
+    else:
+        issues = [store.issue[start:end + 1].tolist() for start, end in zip(starts.tolist(), ends.tolist())]
+    results = []
+    for start, end, m, k, e, window in zip(starts.tolist(), ends.tolist(), modes.tolist(), year_idx.tolist(),
+                                          end_idx.tolist(), issues):
+        year = store.years[k] if k == e else f"{store.years[k]}-{store.years[e]}"
+        results.append((year, [str(x) for x in window], directions[m], list(range(start, end + 1)), store.files[k]))
+    return results
+
+
+def build_results(store, n, hits_by_direction):
+    """把各方向的命中起点（定长 n）转换为 [(year, issues, mode, idxs, file), ...]"""
+    return build_span_results(store, {
+        d: (starts, np.asarray(starts, dtype=np.int64) + n - 1) for d, starts in hits_by_direction.items()
+    })
+
+
+def is_exact(seq):
+    """纯数字的连续号码（非通配/组合条件）"""
+    return seq.isascii() and seq.isdigit()
+
+
+def parse_pattern(text, indicator=None, col_map=COL_MAP):
+    """解析通配与组合条件查询，返回以 * 分隔的片段列表
+
+    每个片段是若干连续期的条件，每期条件为 [(列名, 可取数字元组), ...]，空列表表示任意。
+    单指标写法（需给出 indicator）：2?8*、[13]5，? 为任意一期，[13] 为数字集合，* 为任意多期。
+    组合写法：百位=2&跨度=7,百位=6，逗号分隔相邻各期，& 连接同一期的多个指标条件。
+    col_map 为所查彩种的 指标名 -> 列名。
+    """
+    text = text.strip().replace('，', ',')
+    if '=' in text:
+        tokens = []
+        for part in text.split(','):
+            part = part.strip()
+            if part == '*':
+                tokens.append(part)
+                continue
+            if part == '?':
+                tokens.append([])
+                continue
+            step = []
+            for cond in part.split('&'):
+                name, _, value = cond.partition('=')
+                name = name.strip()
+                if name not in col_map:
+                    raise PatternError(f"未知指标: {name}")
+                digits = _parse_digits(value.strip())
+                if digits is not None:
+                    step.append((col_map[name], digits))
+            tokens.append(step)
+    else:
+        if indicator is None:
+            raise PatternError("单指标通配查询需要指定指标")
+        col = col_map[indicator]
+        tokens = []
+        for token in PATTERN_TOKEN.findall(text):
+            if token == '*':
+                tokens.append(token)
+            else:
+                digits = _parse_digits(token)
+                tokens.append([(col, digits)] if digits is not None else [])
+        if ''.join(PATTERN_TOKEN.findall(text)) != text.replace(' ', ''):
+            raise PatternError(f"无法解析的查询: {text}")
+    segments = [[]]
+    for token in tokens:
+        if token == '*':
+            segments.append([])
+        else:
+            segments[-1].append(token)
+    segments = [segment for segment in segments if segment]
+    # 与纯数字号码至少2位的要求一致：条件太少时几乎每期都命中，结果过大
+    if sum(len(step) for segment in segments for step in segment) < MIN_CONDITIONS:
+        raise PatternError(f"查询至少需要{MIN_CONDITIONS}个确定的条件")
+    return segments
+
+
+def _parse_digits(token):
+    """单个取值：数字、[13]/[1-3] 数字集合，或 ? 表示任意（返回 None）；[0-9] 等同于 ?"""
+    if token == '?':
+        return None
+    if token.isascii() and token.isdigit() and len(token) == 1:
+        return (int(token),)
+    if token.startswith('[') and token.endswith(']') and len(token) > 2:
+        digits = set()
+        for part in PATTERN_SET_PART.findall(token[1:-1]):
+            lo, _, hi = part.partition('-')
+            digits.update(range(int(lo), int(hi or lo) + 1))
+        if digits and ''.join(PATTERN_SET_PART.findall(token[1:-1])) == token[1:-1]:
+            return tuple(sorted(digits)) if len(digits) < 10 else None
+    raise PatternError(f"无法解析的取值: {token}")
+
+
+def is_valid_query(seq, indicator=None, dataset=None):
+    """2位及以上的连续号码，或可解析的通配/组合条件查询"""
+    if is_exact(seq):
+        return len(seq) >= 2
+    dataset = get_dataset(dataset)
+    try:
+        parse_pattern(seq, indicator or dataset.indicators[0], dataset.col_map)
+    except PatternError:
+        return False
+    return True
+
+
+def _condition_positions(store, col, digits):
+    if len(digits) == 1:
+        return store.digit_positions(col, digits[0])
+    return np.sort(np.concatenate([store.digit_positions(col, d) for d in digits]))
+
+
+def match_segment(store, steps):
+    """定长片段的所有起点：从位置索引中最稀有的条件生成候选，其余条件按位置直接校验"""
+    n = len(steps)
+    size = len(store)
+    conditions = [(offset, col, digits) for offset, step in enumerate(steps) for col, digits in step]
+    if n > size:
+        return np.empty(0, dtype=np.int64)
+    if not conditions:
+        return np.arange(size - n + 1, dtype=np.int64)
+    best = min(conditions, key=lambda c: sum(len(store.digit_positions(c[1], d)) for d in c[2]))
+    cand = _condition_positions(store, best[1], best[2]) - best[0]
+    cand = cand[(cand >= 0) & (cand <= size - n)]
+    for offset, col, digits in conditions:
+        if (offset, col, digits) == best or not len(cand):
+            continue
+        values = store.column(col)[cand + offset]
+        cand = cand[values == digits[0] if len(digits) == 1 else np.isin(values, digits)]
+    return cand
+
+
+def match_pattern(store, segments):
+    """返回命中区间 (起点数组, 终点数组)；* 两侧取最近的后续片段"""
+    starts = match_segment(store, segments[0])
+    ends = starts + len(segments[0]) - 1
+    for segment in segments[1:]:
+        next_starts = match_segment(store, segment)
+        i = np.searchsorted(next_starts, ends + 1)
+        ok = i < len(next_starts)
+        starts, ends = starts[ok], next_starts[i[ok]] + len(segment) - 1
+    return starts, ends
+
+
+def _reverse_segments(segments):
+    return [segment[::-1] for segment in segments[::-1]]
+
+
+def pattern_spans(store, text, indicators, search_mode):
+    """通配/组合条件查询的命中区间，返回 指标 -> {方向: (起点数组, 终点数组)}；组合条件放在 COMBINED 键下"""
+    directions = MODE_DIRECTIONS[search_mode]
+    col_map = store.dataset.col_map
+    if '=' in text:
+        parsed = {COMBINED: parse_pattern(text, col_map=col_map)}
+    else:
+        parsed = {ind: parse_pattern(text, ind, col_map) for ind in indicators}
+    return {
+        ind: {d: match_pattern(store, segments if d == "顺序" else _reverse_segments(segments)) for d in directions}
+        for ind, segments in parsed.items()
+    }
+
+
+def search_pattern(store, text, indicators, search_mode):
+    """通配/组合条件查询，返回 指标 -> [(year, issues, mode, idxs, file), ...]"""
+    return {
+        ind: build_span_results(store, spans)
+        for ind, spans in pattern_spans(store, text, indicators, search_mode).items()
+    }
+
+
+def search(store, seq, indicators, search_mode):
+    """在各指标上查找连续号码，返回 指标 -> [(year, issues, mode, idxs, file), ...]
+
+    idxs 为全局时间线上的行号；跨年的命中 year 形如 "2024-2025"，file 为起始期所在文件。
+    非纯数字的 seq 按通配/组合条件查询处理，见 parse_pattern。
+    """
+    if not is_exact(seq):
+        return search_pattern(store, seq, indicators, search_mode)
+    pattern = [int(c) for c in seq]
+    col_map = store.dataset.col_map
+    all_results = {}
+    for ind in indicators:
+        col = col_map[ind]
+        hits = {
+            mode: match_starts(store, col, pattern if mode == "顺序" else pattern[::-1])
+            for mode in MODE_DIRECTIONS[search_mode]
+        }
+        all_results[ind] = build_results(store, len(pattern), hits)
+    return all_results
+
+
+def successor_histograms(store, ends, steps=SUCCESSOR_STEPS):
+    """命中区间之后第 1..steps 期各指标的数字分布，一次向量化 gather
+
+    ends 为各命中区间的终点行号，返回 指标 -> (steps, 10) 的计数矩阵；超出历史末尾的期不计入。
+    """
+    ends = np.asarray(ends, dtype=np.int64)
+    positions = ends[:, None] + np.arange(1, steps + 1)
+    valid = positions < len(store)
+    rows = np.broadcast_to(np.arange(steps), positions.shape)[valid]
+    positions = positions[valid]
+    histograms = {}
+    for ind, col in store.dataset.col_map.items():
+        values = store.column(col)[positions].astype(np.int64)
+        counts = np.bincount(rows * 10 + values, minlength=steps * 10)
+        histograms[ind] = counts.reshape(steps, 10)
+    return histograms
+
+
+def cached_search(store, seq, indicators, search_mode):
+    """带缓存的 search，同一数据版本下相同查询直接返回缓存结果"""
+    key = (store.dataset.key, tuple(indicators), seq, search_mode, store.version)
+    results = _query_cache.get(key)
+    if results is None:
+        results = search(store, seq, indicators, search_mode)
+        _query_cache.put(key, results)
+    return results
+
+
+def cache_info():
+    """查询缓存的命中/未命中统计"""
+    return _query_cache.info()
+
+
+class Sort3Engine:
+    """基于已加载历史数据的查询引擎，可脱离 Streamlit 在脚本或命令行中使用"""
+
+    def __init__(self, store=None, data_dir=DATA_DIR, dataset=None):
+        self.store = store if store is not None else get_store(data_dir, dataset)
+        self._windows = {}  # (列名, 长度) -> (排序后的窗口值, 对应起点)
+
+    def _window_index(self, col, n):
+        """列 col 上所有长度为 n 的窗口按十进制编码为 int64 并排序，同一长度的号码共用"""
+        key = (col, n)
+        if key not in self._windows:
+            values = self.store.column(col).astype(np.int64)
+            count = len(values) - n + 1
+            if count <= 0:
+                # 历史期数少于号码长度，没有任何窗口
+                empty = np.empty(0, dtype=np.int64)
+                self._windows[key] = (empty, empty)
+                return self._windows[key]
+            codes = np.zeros(count, dtype=np.int64)
+            for k in range(n):
+                codes = codes * 10 + values[k:k + count]
+            order = np.argsort(codes, kind='stable')
+            self._windows[key] = (codes[order], order)
+        return self._windows[key]
+
+    def _starts(self, col, seq):
+        n = len(seq)
+        if n > MAX_CODE_LENGTH:
+            return match_starts(self.store, col, [int(c) for c in seq])
+        codes, order = self._window_index(col, n)
+        code = int(seq)
+        lo, hi = np.searchsorted(codes, [code, code + 1])
+        # 排序是稳定的，同一窗口值的起点本身已升序
+        return order[lo:hi]
+
+    def search(self, patterns, indicators=None, mode="双向查找"):
+        """批量查找，patterns 为号码或号码列表，返回 号码 -> {指标: [(year, issues, mode, idxs, file), ...]}"""
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        return dict(self.iter_search(patterns, indicators, mode))
+
+    def iter_starts(self, patterns, indicators=None, mode="双向查找"):
+        """逐个产出 (号码, {指标: {方向: 命中起点数组}})；同一长度的号码共用一份窗口索引"""
+        indicators = indicators or self.store.dataset.indicators
+        col_map = self.store.dataset.col_map
+        directions = MODE_DIRECTIONS[mode]
+        for seq in patterns:
+            if not is_exact(seq):
+                spans = pattern_spans(self.store, seq, indicators, mode)
+                yield seq, {ind: {d: hits[0] for d, hits in by_dir.items()} for ind, by_dir in spans.items()}
+                continue
+            yield seq, {
+                ind: {d: self._starts(col_map[ind], seq if d == "顺序" else seq[::-1]) for d in directions}
+                for ind in indicators
+            }
+
+    def iter_search(self, patterns, indicators=None, mode="双向查找"):
+        """逐个产出 (号码, {指标: [(year, issues, mode, idxs, file), ...]})"""
+        indicators = indicators or self.store.dataset.indicators
+        for seq in patterns:
+            if not is_exact(seq):
+                yield seq, search_pattern(self.store, seq, indicators, mode)
+                continue
+            _, starts = next(self.iter_starts([seq], indicators, mode))
+            yield seq, {ind: build_results(self.store, len(seq), hits) for ind, hits in starts.items()}
@@ -0,0 +1,115 @@
+# 上下文窗口：命中区间前后各展示的期数
+CONTEXT_ROWS = 3
+# 明细分页：每页展示的匹配数
+PAGE_SIZE = 20
+MODE_COLOR = {'顺序': '#2ecc40', '逆序': '#ff8000'}
+
+
+def context_window(store, idxs):
+    """命中区间在全局时间线上的上下文范围 [start, end)，可跨越年份边界"""
+    start = max(idxs[0] - CONTEXT_ROWS, 0)
+    end = min(idxs[-1] + CONTEXT_ROWS + 1, len(store))
+    hit_range = range(idxs[0], idxs[-1] + 1)
+    return start, end, hit_range
+
+
+def trend_html(value, hit):
+    """0-9 走势，命中行的数字标红"""
+    balls = []
+    for j in range(10):
+        if value == j and hit:
+            balls.append(f'<span style="color:#e60000;font-weight:bold;">{j}</span>')
+        else:
+            balls.append(f'<span style="color:#bbb;">{j}</span>')
+    return " ".join(balls)
+
+
+def match_info_html(idx, year, issues, mode):
+    """匹配信息标题，缩进"""
+    mode_disp = '<span style="color:{};font-weight:bold;">{}</span>'.format(MODE_COLOR.get(mode, '#0074D9'), mode)
+    return (
+        '<div style="margin-left:32px;">'
+        '<span style="font-size:20px;font-weight:bold;color:#0074D9;">匹配{}:</span> '
+        '<span style="font-size:16px;color:#555;">年份：</span><span style="font-size:16px;font-weight:bold;color:#222;">{}</span>，'
+        '<span style="font-size:16px;color:#555;">期号：</span><span style="font-size:16px;font-weight:bold;color:#0074D9;">{}</span>，'
+        '<span style="font-size:16px;color:#555;">模式：</span>{}'
+        '</div>'
+    ).format(idx, year, ','.join(issues), mode_disp)
+
+
+def match_table_html(store, ind, idxs):
+    """直接从内存数组切出上下文窗口，生成明细表格"""
+    start, end, hit_range = context_window(store, idxs)
+    issue = store.issue[start:end].tolist()
+    positions = [store.column(col)[start:end].tolist() for col in store.dataset.position_columns]
+    prizes = ["".join(str(p[i]) for p in positions) for i in range(end - start)]
+    sums = store.column("sum")[start:end].tolist()
+    col_map = store.dataset.col_map
+    if ind not in col_map:
+        return combined_table_html(store, start, end, hit_range, issue, prizes, sums)
+    values = store.column(col_map[ind])[start:end].tolist()
+    rows = [
+        f"<tr><td>{issue[i]}</td><td>{prizes[i]}</td><td>{sums[i]}</td>"
+        f"<td style='font-family:monospace;'>{trend_html(values[i], start + i in hit_range)}</td></tr>"
+        for i in range(end - start)
+    ]
+    return (
+        "<div style='margin-left:32px;'><table border='1' style='border-collapse:collapse;'>"
+        f"<tr><th>期号</th><th>奖号</th><th>和值</th><th>{ind}走势</th></tr>"
+        + "".join(rows)
+        + "</table></div>"
+    )
+
+
+def combined_table_html(store, start, end, hit_range, issue, prizes, sums):
+    """组合条件的明细表格：同时列出各指标，命中区间整行标红"""
+    labels = [label for label, _ in store.dataset.positions] + ["和尾", "跨度"]
+    col_map = store.dataset.col_map
+    columns = [store.column(col_map[label])[start:end].tolist() for label in labels]
+    rows = []
+    for i in range(end - start):
+        style = " style='color:#e60000;font-weight:bold;'" if start + i in hit_range else ""
+        cells = "".join(f"<td>{values[i]}</td>" for values in columns)
+        rows.append(f"<tr{style}><td>{issue[i]}</td><td>{prizes[i]}</td><td>{sums[i]}</td>{cells}</tr>")
+    header = "".join(f"<th>{label}</th>" for label in labels)
+    return (
+        "<div style='margin-left:32px;'><table border='1' style='border-collapse:collapse;'>"
+        f"<tr><th>期号</th><th>奖号</th><th>和值</th>{header}</tr>"
+        + "".join(rows)
+        + "</table></div>"
+    )
+
+
+def page_count(total, page_size=PAGE_SIZE):
+    return max((total + page_size - 1) // page_size, 1)
+
+
+def results_page_html(store, ind, results, page, page_size=PAGE_SIZE):
+    """一页匹配明细（第 page 页，从 1 开始），一次拼接为单个 HTML 片段"""
+    first = (page - 1) * page_size
+    parts = []
+    for idx, (year, issues, mode, idxs, file) in enumerate(results[first:first + page_size], first + 1):
+        parts.append(match_info_html(idx, year, issues, mode))
+        parts.append(match_table_html(store, ind, idxs))
+    return "".join(parts)
+
+
+def successor_rows(histograms):
+    """后续分布的长表：每行为 (后续期, 指标, 数字, 次数)"""
+    rows = []
+    for ind, counts in histograms.items():
+        for k, row in enumerate(counts.tolist(), 1):
+            for digit, count in enumerate(row):
+                rows.append({"后续期": f"第{k}期", "指标": ind, "数字": digit, "次数": count})
+    return rows
+
+
+def summarize(all_results):
+    """各指标、各模式的匹配数汇总"""
+    summary = []
+    for ind in all_results:
+        counts = {"顺序": 0, "逆序": 0}
+        for result in all_results[ind]:
+            counts[result[2]] += 1
+        summary.append({"指标": ind, "顺序": counts["顺序"], "逆序": counts["逆序"], "合计": len(all_results[ind])})
+    return summary
@@ -9,10 +9,17 @@ a = Analysis(
     datas=[
         ('data', 'data'),  # Include data directory
         ('app.py', '.'),   # Include app.py in the root directory
+        ('datasets.py', '.'),
+        ('history_store.py', '.'),
+        ('query_engine.py', '.'),
+        ('result_render.py', '.'),
+        ('omission_stats.py', '.'),
+        ('perf_utils.py', '.'),
     ],
     hiddenimports=[
         'streamlit',
         'pandas',
+        'numpy',
         'streamlit.runtime.scriptrunner.magic_funcs',
         'streamlit.runtime.scriptrunner.script_runner',
         'streamlit.runtime.scriptrunner.script_run_context',
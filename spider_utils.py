@@ -1,16 +1,19 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import pandas as pd
+from datasets import SORT3, get_dataset
+from history_store import append_draws, data_signature, load_snapshot, refresh_snapshot, write_manifest, write_snapshot
+from omission_stats import update_stats_file
 import os
-from datetime import datetime, timedelta
-import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 import logging
 import glob
+import queue
+import shutil
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urlsplit, urlunsplit
+from urllib.request import Request, urlopen
 
 def setup_logger():
     log_dir = 'log'
@@ -37,92 +40,434 @@ def setup_logger():
 
 logger = setup_logger()
 
-def calculate_additional_fields(hundred, ten, unit):
-    h, t, u = map(int, [hundred, ten, unit])
-    sum_value = h + t + u
-    tail = sum_value % 10
-    gap = max(h, t, u) - min(h, t, u)
-    return sum_value, tail, gap
+# 并行抓取年份时的浏览器会话数
+FETCH_WORKERS = int(os.environ.get('P3_FETCH_WORKERS', 4))
+# 等待页面元素/表格刷新的超时秒数
+PAGE_TIMEOUT = 10
+
+# 表格中第一条数据行的期号，用于判断切换年份后表格是否已刷新
+FIRST_ISSUE_JS = """
+var table = document.getElementById('chartsTable');
+if (!table) return '';
+for (var i = 0; i < table.rows.length; i++) {
+    var cell = table.rows[i].cells[0];
+    if (cell && /^\\d+$/.test(cell.textContent.trim())) return cell.textContent.trim();
+}
+return '';
+"""
+# 切换年份下拉框并触发 change 事件；下拉框不存在或没有该年份选项时返回 false
+SELECT_YEAR_JS = """
+var select = document.getElementById('year');
+if (!select) return false;
+select.value = arguments[0];
+if (select.value !== arguments[0]) return false;
+select.dispatchEvent(new Event('change', {bubbles: true}));
+return true;
+"""
+# 一次性返回整张表：表头文本和各数据行的单元格文本
+TABLE_JS = """
+var table = document.getElementById('chartsTable');
+if (!table) return null;
+var header = [], rows = [];
+for (var i = 0; i < table.rows.length; i++) {
+    var cells = table.rows[i].cells, texts = [], isHeader = false;
+    for (var j = 0; j < cells.length; j++) {
+        texts.push(cells[j].textContent.trim());
+        if (cells[j].tagName === 'TH') isHeader = true;
+    }
+    if (isHeader && header.length === 0) header = texts;
+    else rows.push(texts);
+}
+return {header: header, rows: rows};
+"""
+# 排列三 CSV 列顺序，与历史文件一致；其他彩种为 dataset.csv_columns
+CSV_COLUMNS = SORT3.csv_columns
+# 读取最后一期时从文件末尾读取的字节数
+TAIL_BYTES = 4096
+HTTP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36'
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path():
+    """ChromeDriver 只安装一次，进程内复用"""
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def create_driver():
+    # 浏览器依赖只在真正需要启动 Chrome 时导入，解析表格和HTTP抓取不依赖 selenium
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
 
-def fetch_p3_data_selenium(year):
-    logger.info(f'开始抓取{year}年数据...')
-    url = "https://www.00038.cn/zs_p3/chzs.htm"
     options = Options()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    service = Service(get_driver_path())
+    return webdriver.Chrome(service=service, options=options)
+
+
+class DriverPool:
+    """无头 Chrome 会话池，抓取多个年份时复用浏览器而不是每年重新启动"""
+
+    def __init__(self, size=FETCH_WORKERS):
+        self.size = size
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+        # 同时使用中的会话不超过 size 个；只在没有空闲会话时新建，因此浏览器总数也不超过 size
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def driver(self):
+        with self._slots:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = create_driver()
+                with self._lock:
+                    self._drivers.append(driver)
+            try:
+                yield driver
+            except Exception:
+                # 出错的会话可能已不可用，直接丢弃
+                self._discard(driver)
+                raise
+            else:
+                self._idle.put(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f'关闭浏览器会话出错: {e}')
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning(f'关闭浏览器会话出错: {e}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _wait_until(condition, timeout=PAGE_TIMEOUT, interval=0.2):
+    """轮询 condition 直到返回真值，超时抛出 TimeoutError"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f'等待页面超时（{timeout}秒）')
+        time.sleep(interval)
+
+
+def _select_year(driver, year, url, timeout=PAGE_TIMEOUT):
+    """打开走势图并切换年份，等待表格内容刷新为该年数据"""
+    driver.get(url)
+    # 页面加载完成前下拉框可能不存在，重试直到切换成功
+    _wait_until(lambda: driver.execute_script(SELECT_YEAR_JS, str(year)), timeout)
+    _wait_until(lambda: driver.execute_script(FIRST_ISSUE_JS).startswith(str(year)), timeout)
+
+
+def parse_table_rows(header, rows, year=None, dataset=None):
+    """将表头和各行单元格文本解析为数据记录；year 不为空时只保留该年期号"""
+    dataset = get_dataset(dataset)
+    # 自动识别"奖号"列索引
+    prize_col_idx = None
+    for idx, text in enumerate(header):
+        if "奖号" in text:
+            prize_col_idx = idx
+            break
+    if prize_col_idx is None:
+        logger.error("未找到奖号列")
+        return []
+    data = []
+    for cols in rows:
+        if len(cols) <= prize_col_idx:
+            continue
+        issue = cols[0].strip()
+        # 奖号各位之间可能带空格，如 "1 2 3 4 5"
+        prize = ''.join(cols[prize_col_idx].split())
+        # 只保留期号为全数字的行，过滤掉统计、预选等非数据行
+        if not issue.isdigit() or len(prize) != dataset.digits or not prize.isdigit():
+            continue
+        if year is not None and not issue.startswith(str(year)):
+            continue
+        data.append(dataset.record(issue, prize))
+    return data
+
+
+def _extract_rows(driver):
+    """一次 execute_script 取回整张表的单元格文本，避免逐个单元格的 WebDriver 往返"""
+    table = driver.execute_script(TABLE_JS)
+    if not table:
+        logger.error("未找到chartsTable")
+        return [], []
+    return table["header"], table["rows"]
+
+
+class ChartTableParser(HTMLParser):
+    """从 HTML 中解析 chartsTable 的表头和各行单元格文本"""
+
+    def __init__(self):
+        super().__init__()
+        self.header = []
+        self.rows = []
+        self._depth = 0       # 位于 chartsTable 内的 table 嵌套深度
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._depth or dict(attrs).get('id') == 'chartsTable':
+                self._depth += 1
+            return
+        if self._depth != 1:
+            return
+        if tag == 'tr':
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+            self._row.append((tag, self._cell))
+
+    def handle_endtag(self, tag):
+        if tag == 'table' and self._depth:
+            self._depth -= 1
+        elif tag == 'tr' and self._depth == 1 and self._row is not None:
+            tags = [t for t, _ in self._row]
+            texts = [''.join(cell).strip() for _, cell in self._row]
+            if not self.header and 'th' in tags:
+                self.header = texts
+            elif texts:
+                self.rows.append(texts)
+            self._row = None
+            self._cell = None
+        elif tag in ('td', 'th') and self._depth == 1:
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None and self._depth == 1:
+            self._cell.append(data)
+
+
+def _decode(body, charset):
+    for encoding in [charset, 'utf-8', 'gb18030']:
+        if not encoding:
+            continue
+        try:
+            return body.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return body.decode('utf-8', errors='replace')
+
+
+def year_url(url, year):
+    """按年份请求的地址；file: 等本地夹具地址原样返回
+
+    year 查询参数并非公开接口，只是推测；页面不认该参数时表格中没有该年期号，调用方会回退到浏览器抓取。
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        return url
+    query = '&'.join(q for q in [parts.query, urlencode({'year': year})] if q)
+    return urlunsplit(parts._replace(query=query))
+
+
+def fetch_p3_data_http(year, url=None, dataset=None):
+    """不启动浏览器，直接请求页面并解析表格；页面未直接给出该年数据时返回空列表"""
+    dataset = get_dataset(dataset)
+    url = url or dataset.url
+    logger.info(f'尝试HTTP方式抓取{dataset.name}{year}年数据...')
+    request = Request(year_url(url, year), headers={'User-Agent': HTTP_USER_AGENT})
+    try:
+        with urlopen(request, timeout=PAGE_TIMEOUT) as response:
+            html = _decode(response.read(), response.headers.get_content_charset())
+    except (OSError, ValueError) as e:
+        logger.warning(f'HTTP抓取{year}年数据失败: {e}')
+        return []
+    parser = ChartTableParser()
+    parser.feed(html)
+    data = parse_table_rows(parser.header, parser.rows, year, dataset)
+    logger.info(f'HTTP方式获取{dataset.name}{year}年数据{len(data)}期')
+    return data
+
+
+def fetch_p3_data_selenium(year, pool=None, url=None, dataset=None):
+    """抓取指定年份数据；传入 pool 时复用其中的浏览器会话"""
+    dataset = get_dataset(dataset)
+    url = url or dataset.url
+    logger.info(f'开始抓取{dataset.name}{year}年数据...')
+    if pool is None:
+        with DriverPool(size=1) as own_pool:
+            return fetch_p3_data_selenium(year, own_pool, url, dataset)
+    data = []
     try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "year"))
-        )
-        select = Select(driver.find_element(By.ID, "year"))
-        select.select_by_value(str(year))
-        time.sleep(2)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "chartsTable"))
-        )
-        table = driver.find_element(By.ID, "chartsTable")
-        rows = table.find_elements(By.TAG_NAME, "tr")
-        header_cols = rows[0].find_elements(By.TAG_NAME, "th")
-        prize_col_idx = None
-        for idx, th in enumerate(header_cols):
-            if "奖号" in th.text:
-                prize_col_idx = idx
-                break
-        if prize_col_idx is None:
-            print("未找到奖号列")
-            return []
-        data = []
-        for row in rows[1:]:
-            cols = row.find_elements(By.TAG_NAME, "td")
-            if len(cols) <= prize_col_idx:
-                continue
-            issue = cols[0].text.strip()
-            prize = cols[prize_col_idx].text.strip()
-            if not issue.isdigit() or len(prize) != 3:
-                continue
-            hundred, ten, unit = prize[0], prize[1], prize[2]
-            sum_value, tail, gap = calculate_additional_fields(hundred, ten, unit)
-            data.append({
-                "issue": issue,
-                "prize": prize,
-                "hundred": hundred,
-                "ten": ten,
-                "unit": unit,
-                "sum": sum_value,
-                "tail": tail,
-                "gap": gap
-            })
-        logger.info(f'{year}年数据抓取完成，共{len(data)}期')
+        with pool.driver() as driver:
+            _select_year(driver, year, url)
+            header, rows = _extract_rows(driver)
+        data = parse_table_rows(header, rows, year, dataset)
+        logger.info(f'{dataset.name}{year}年数据抓取完成，共{len(data)}期')
     except Exception as e:
-        logger.error(f'抓取{year}年数据出错: {e}')
-    finally:
-        driver.quit()
+        logger.error(f'抓取{dataset.name}{year}年数据出错: {e}')
     return data
 
-def update_current_year_data():
+
+def is_whole_year(data, year):
+    """数据是否为该年从第001期起连续的全部期号
+
+    页面若忽略 year 参数而显示默认视图（如最近N期），HTTP方式只能拿到一年的后半段，
+    update_all 会用它覆盖完整的年份文件，因此只接受从第一期起连续的结果。
+    """
+    issues = sorted(int(row["issue"]) for row in data)
+    first = int(year) * 1000 + 1
+    return bool(issues) and issues == list(range(first, first + len(issues)))
+
+
+def fetch_p3_data(year, pool=None, url=None, dataset=None):
+    """优先使用轻量的HTTP方式，结果不能证明是该年全部数据时回退到浏览器抓取"""
+    data = fetch_p3_data_http(year, url, dataset)
+    if is_whole_year(data, year):
+        return data
+    if data:
+        logger.warning(f'HTTP方式获取的{year}年数据不是从第一期起连续的全年数据，改用浏览器抓取')
+    return fetch_p3_data_selenium(year, pool, url, dataset)
+
+
+def fetch_years(years, workers=FETCH_WORKERS, url=None, dataset=None):
+    """并行抓取多个年份，共用一个浏览器会话池，返回 年份 -> 数据"""
+    results = {}
+    # 浏览器会话在HTTP方式失败时才按需创建
+    with DriverPool(size=workers) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_p3_data, year, pool, url, dataset): year for year in years}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    return results
+
+def read_tail_issues(path):
+    """只读取文件末尾，返回其中各行的期号（按文件中的顺序）；文件不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(size - TAIL_BYTES, 0)
+        f.seek(start)
+        lines = f.read().decode('utf-8-sig', errors='ignore').splitlines()
+    if start > 0:
+        # 第一行可能被截断，期号不完整
+        lines = lines[1:]
+    issues = []
+    for line in lines:
+        issue = line.split(',', 1)[0].strip()
+        if issue.isdigit():
+            issues.append(int(issue))
+    return issues
+
+
+def sort_year_file(path):
+    """按期号重写整个年份文件并去掉重复期号（保留先出现的行），同样先写临时文件再原子替换"""
+    with open(path, encoding='utf-8-sig') as f:
+        lines = f.read().splitlines()
+    header, rows = lines[0], {}
+    for line in lines[1:]:
+        issue = line.split(',', 1)[0].strip()
+        if issue.isdigit():
+            rows.setdefault(int(issue), line)
+    with open(path + '.tmp', 'w', encoding='utf-8-sig', newline='') as f:
+        f.write(header + '\n')
+        f.writelines(rows[issue] + '\n' for issue in sorted(rows))
+    os.replace(path + '.tmp', path)
+
+
+def append_rows(path, rows, columns=CSV_COLUMNS):
+    """把新数据追加到CSV：先复制为临时文件并在其末尾追加，再原子替换，读取方不会看到写了一半的文件"""
+    tmp_path = path + '.tmp'
+    if os.path.exists(path):
+        shutil.copyfile(path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            needs_newline = False
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        with open(tmp_path, 'a', encoding='utf-8', newline='') as f:
+            if needs_newline:
+                f.write('\n')
+            f.writelines(','.join(str(row[name]) for name in columns) + '\n' for row in rows)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write(','.join(columns) + '\n')
+            f.writelines(','.join(str(row[name]) for name in columns) + '\n' for row in rows)
+    os.replace(tmp_path, path)
+
+
+def append_new_draws(year, data, data_dir='data', dataset=None):
+    """增量更新：只按期号顺序追加最后一期之后的新数据，并增量更新二进制快照；返回新增期数"""
+    dataset = get_dataset(dataset)
+    file_path = dataset.file_path(data_dir, year)
+    tail = read_tail_issues(file_path)
+    rewritten = any(b <= a for a, b in zip(tail, tail[1:]))
+    if rewritten:
+        # 旧版爬虫按 set 顺序追加，文件末尾未必是最大期号：整体按期号重写一次，之后只需看末尾
+        logger.warning(f'{file_path} 中的期号未按顺序排列，已按期号重写')
+        sort_year_file(file_path)
+        tail = read_tail_issues(file_path)
+    last_issue = max(tail) if tail else None
+    # 同一期只追加一次
+    new_rows = {}
+    for row in data:
+        issue = int(row["issue"])
+        if last_issue is None or issue > last_issue:
+            new_rows.setdefault(issue, row)
+    new_rows = [new_rows[issue] for issue in sorted(new_rows)]
+    if not new_rows and not rewritten:
+        return 0
+    # 重写过的文件与旧快照不再对应，需从CSV重建
+    snapshot = None if rewritten else load_snapshot(data_dir, dataset=dataset)
+    if new_rows:
+        append_rows(file_path, new_rows, dataset.csv_columns)
+    if snapshot is not None and (not snapshot.years or int(snapshot.years[-1]) <= int(year)):
+        store = append_draws(snapshot, year, file_path, new_rows, data_signature(data_dir, dataset))
+        write_snapshot(store, data_dir)
+    else:
+        store = refresh_snapshot(data_dir, dataset)
+    # 遗漏与频率统计只补算新增的期；文件被重写时整体重建
+    update_stats_file(store, data_dir, rebuild=rewritten)
+    # 最后写入通知文件，应用据此热加载新数据
+    write_manifest(store, data_dir)
+    return len(new_rows)
+
+
+def update_current_year_data(dataset=None):
+    dataset = get_dataset(dataset)
     current_year = datetime.now().year
-    file_path = f"data/sort3_{current_year}.csv"
-    logger.info(f"开始更新{current_year}年数据...")
-    new_data = fetch_p3_data_selenium(current_year)
+    file_path = dataset.file_path('data', current_year)
+    logger.info(f"开始更新{dataset.name}{current_year}年数据...")
+    new_data = fetch_p3_data(current_year, dataset=dataset)
     if not new_data:
-        logger.warning(f"未获取到{current_year}年数据。")
+        logger.warning(f"未获取到{dataset.name}{current_year}年数据。")
         return
-    new_df = pd.DataFrame(new_data)
-    if os.path.exists(file_path):
-        existing_df = pd.read_csv(file_path)
-        existing_issues = set(existing_df['issue'].astype(str))
-        new_issues = set(new_df['issue'].astype(str))
-        added_issues = list(new_issues - existing_issues)
-        if added_issues:
-            new_records = new_df[new_df['issue'].isin(added_issues)]
-            updated_df = pd.concat([existing_df, new_records], ignore_index=True)
-            updated_df.to_csv(file_path, index=False, encoding="utf-8-sig")
-            logger.info(f"已更新{len(added_issues)}期新数据到 {file_path}")
-        else:
-            logger.info("没有新数据需要更新。")
+    added = append_new_draws(current_year, new_data, dataset=dataset)
+    if added:
+        logger.info(f"已追加{added}期新数据到 {file_path}")
     else:
-        new_df.to_csv(file_path, index=False, encoding="utf-8-sig")
-        logger.info(f"数据已保存到 {file_path}") 
\ No newline at end of file
+        logger.info("没有新数据需要更新。")
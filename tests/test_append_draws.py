@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from history_store import load_snapshot
+from omission_stats import OmissionStats, load_stats_file
+from spider_utils import CSV_COLUMNS, append_new_draws, read_tail_issues
+
+HEADER = ",".join(CSV_COLUMNS)
+
+
+def draw(issue, prize):
+    digits = [int(d) for d in prize]
+    return {"issue": str(issue), "prize": prize, "hundred": prize[0], "ten": prize[1], "unit": prize[2],
+            "sum": sum(digits), "tail": sum(digits) % 10, "gap": max(digits) - min(digits)}
+
+
+def write_year(path, draws):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(HEADER + "\n")
+        f.writelines(",".join(str(row[c]) for c in CSV_COLUMNS) + "\n" for row in draws)
+
+
+def file_issues(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return [int(line.split(",", 1)[0]) for line in f.read().splitlines()[1:]]
+
+
+DRAWS = [draw(2025000 + i, f"{i % 10}{(i * 3) % 10}{(i * 7) % 10}") for i in range(1, 161)]
+
+
+def test_append_to_current_file_is_noop(tmp_path):
+    path = os.path.join(tmp_path, "sort3_2025.csv")
+    write_year(path, DRAWS[:159])
+    assert append_new_draws(2025, DRAWS[:159], str(tmp_path)) == 0
+    assert file_issues(path) == list(range(2025001, 2025160))
+    assert not os.path.exists(os.path.join(tmp_path, "sort3_manifest.json"))
+
+
+def test_append_new_draws_in_issue_order(tmp_path):
+    path = os.path.join(tmp_path, "sort3_2025.csv")
+    write_year(path, DRAWS[:150])
+    # 抓取结果乱序且含重复期
+    fetched = DRAWS[:160][::-1] + DRAWS[155:157]
+    assert append_new_draws(2025, fetched, str(tmp_path)) == 10
+    assert file_issues(path) == list(range(2025001, 2025161))
+    store = load_snapshot(str(tmp_path))
+    assert store.issue.tolist() == list(range(2025001, 2025161))
+    assert load_stats_file(str(tmp_path)).to_dict() == OmissionStats.from_store(store).to_dict()
+
+
+def test_append_to_shuffled_file(tmp_path):
+    path = os.path.join(tmp_path, "sort3_2025.csv")
+    # 旧版爬虫按 set 顺序追加：末尾三期为 159、157、158
+    write_year(path, DRAWS[:156] + [DRAWS[158], DRAWS[156], DRAWS[157]])
+    assert read_tail_issues(path)[-3:] == [2025159, 2025157, 2025158]
+    assert append_new_draws(2025, DRAWS[:160], str(tmp_path)) == 1
+    assert file_issues(path) == list(range(2025001, 2025161))
+    store = load_snapshot(str(tmp_path))
+    assert store.issue.tolist() == list(range(2025001, 2025161))
+    assert np.array_equal(store.column("hundred"), [int(row["hundred"]) for row in DRAWS[:160]])
+    assert load_stats_file(str(tmp_path)).to_dict() == OmissionStats.from_store(store).to_dict()
+
+
+def test_shuffled_file_without_new_draws_is_still_sorted(tmp_path):
+    path = os.path.join(tmp_path, "sort3_2025.csv")
+    write_year(path, DRAWS[:156] + [DRAWS[158], DRAWS[156], DRAWS[157]])
+    assert append_new_draws(2025, DRAWS[:159], str(tmp_path)) == 0
+    assert file_issues(path) == list(range(2025001, 2025160))
+    assert load_snapshot(str(tmp_path)).issue.tolist() == list(range(2025001, 2025160))
+    assert os.path.exists(os.path.join(tmp_path, "sort3_manifest.json"))
+
+
+def test_read_tail_issues_skips_truncated_first_line(tmp_path):
+    path = os.path.join(tmp_path, "sort3_2025.csv")
+    write_year(path, DRAWS * 3)
+    issues = read_tail_issues(path)
+    assert all(2025001 <= issue <= 2025160 for issue in issues)
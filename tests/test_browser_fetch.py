@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import pytest
+
+import spider_utils
+from spider_utils import (FIRST_ISSUE_JS, SELECT_YEAR_JS, TABLE_JS, ChartTableParser, DriverPool,
+                          _select_year, fetch_p3_data_selenium)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "chzs.htm")
+YEARS = ["2024", "2025"]
+
+
+class FakeDriver:
+    """按 spider_utils 中的脚本应答的假浏览器，页面内容来自本地 HTML 夹具"""
+
+    def __init__(self):
+        self.url = None
+        self.year = None
+        self.quit_called = False
+
+    def get(self, url):
+        self.url = url
+        self.year = None
+
+    def execute_script(self, script, *args):
+        if script == SELECT_YEAR_JS:
+            if args[0] not in YEARS:
+                return False
+            self.year = args[0]
+            return True
+        parser = ChartTableParser()
+        with open(self.url, encoding="utf-8") as f:
+            parser.feed(f.read())
+        if script == FIRST_ISSUE_JS:
+            # 切换年份前表格仍是上一年的数据
+            return parser.rows[0][0] if self.year == "2025" else "2024001"
+        if script == TABLE_JS:
+            return {"header": parser.header, "rows": parser.rows}
+        raise AssertionError("unexpected script")
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def drivers(monkeypatch):
+    created = []
+
+    def create_driver():
+        created.append(FakeDriver())
+        return created[-1]
+
+    monkeypatch.setattr(spider_utils, "create_driver", create_driver)
+    return created
+
+
+def test_select_year_waits_for_table():
+    driver = FakeDriver()
+    _select_year(driver, 2025, FIXTURE, timeout=1)
+    assert driver.year == "2025"
+
+
+def test_select_year_times_out_on_missing_year():
+    with pytest.raises(TimeoutError):
+        _select_year(FakeDriver(), 2030, FIXTURE, timeout=0.3)
+
+
+def test_fetch_selenium_from_fixture(drivers):
+    with DriverPool(size=1) as pool:
+        first = fetch_p3_data_selenium(2025, pool, FIXTURE)
+        second = fetch_p3_data_selenium(2025, pool, FIXTURE)
+    assert [row["prize"] for row in first] == ["274", "039", "555"]
+    assert second == first
+    # 第二次抓取复用同一个浏览器会话，关闭池时退出
+    assert len(drivers) == 1 and drivers[0].quit_called
+
+
+def test_pool_bounds_concurrent_drivers(drivers):
+    pool = DriverPool(size=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with pool.driver():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pool.close()
+    assert len(drivers) == 2
+    assert max(peak) == 2
+
+
+def test_pool_discards_failed_driver(drivers):
+    with DriverPool(size=1) as pool:
+        with pytest.raises(RuntimeError):
+            with pool.driver():
+                raise RuntimeError("page crashed")
+        assert drivers[0].quit_called
+        with pool.driver() as driver:
+            assert driver is drivers[1]
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import spider_utils
+from spider_utils import ChartTableParser, fetch_p3_data, fetch_p3_data_http, is_whole_year, parse_table_rows
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "chzs.htm")
+
+
+def parse_fixture():
+    parser = ChartTableParser()
+    with open(FIXTURE, encoding="utf-8") as f:
+        parser.feed(f.read())
+    return parser
+
+
+def test_parser_reads_only_charts_table():
+    parser = parse_fixture()
+    assert parser.header == ["期号", "奖号", "百位", "十位", "个位"]
+    assert [row[0] for row in parser.rows] == ["2025001", "2025002", "2025003", "2024358", "出现次数", "预选行"]
+    # 嵌套表格中的文字不计入外层单元格
+    assert parser.rows[1][1] == "0 3 9"
+
+
+def test_parse_table_rows_keeps_draws_of_the_year():
+    parser = parse_fixture()
+    data = parse_table_rows(parser.header, parser.rows, 2025)
+    assert [row["issue"] for row in data] == ["2025001", "2025002", "2025003"]
+    assert data[1] == {"issue": "2025002", "prize": "039", "hundred": "0", "ten": "3", "unit": "9",
+                       "sum": 12, "tail": 2, "gap": 9}
+
+
+def test_parse_table_rows_without_prize_column():
+    assert parse_table_rows(["期号", "百位"], [["2025001", "2"]]) == []
+
+
+def test_fetch_http_from_file_fixture():
+    data = fetch_p3_data_http(2025, Path(FIXTURE).resolve().as_uri())
+    assert [row["prize"] for row in data] == ["274", "039", "555"]
+
+
+def test_fetch_uses_http_only_for_whole_year(monkeypatch):
+    fallback = []
+    monkeypatch.setattr(spider_utils, "fetch_p3_data_selenium",
+                        lambda year, pool, url, dataset: fallback.append(year) or ["browser"])
+    url = Path(FIXTURE).resolve().as_uri()
+    assert [row["issue"] for row in fetch_p3_data(2025, url=url)] == ["2025001", "2025002", "2025003"]
+    assert fallback == []
+    # 夹具中2024年只有最后一期，不能覆盖全年文件
+    assert fetch_p3_data(2024, url=url) == ["browser"]
+    assert fallback == [2024]
+
+
+def test_is_whole_year():
+    rows = [{"issue": str(2025000 + i)} for i in (3, 1, 2)]
+    assert is_whole_year(rows, 2025)
+    assert not is_whole_year(rows[:2], 2025)
+    assert not is_whole_year([{"issue": "2025002"}, {"issue": "2025003"}], 2025)
+    assert not is_whole_year([], 2025)
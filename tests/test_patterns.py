@@ -0,0 +1,19 @@
+import pytest
+
+from query_engine import PatternError, is_valid_query, parse_pattern
+
+
+@pytest.mark.parametrize("query", ["12", "2?8", "[13]5", "2*8", "百位=2&跨度=7", "百位=2,百位=6"])
+def test_valid_queries(query):
+    assert is_valid_query(query)
+
+
+@pytest.mark.parametrize("query", ["1", "2?", "[0-9]", "[0-9]*[0-9]", "[0-9][0-9]1", "百位=2", "百位=[0-9]&跨度=7"])
+def test_queries_need_two_conditions(query):
+    assert not is_valid_query(query)
+
+
+def test_full_digit_set_is_a_wildcard():
+    assert parse_pattern("[0-9]2[13]", "百位") == [[[], [("hundred", (2,))], [("hundred", (1, 3))]]]
+    with pytest.raises(PatternError):
+        parse_pattern("[0-9]*[0-9]", "百位")